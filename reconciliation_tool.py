@@ -1,14 +1,23 @@
 import argparse
+import glob
+import hashlib
 import logging
 import re
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import numpy as np
 import pandas as pd
 
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
+# Copy-on-write (always on from pandas 3) lets filtered frames share buffers
+# with the loaded data instead of being copied up front.
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.options.mode.copy_on_write = True
+
+if TYPE_CHECKING:
+    import tkinter as tk
 
 # Logging configuration
 logging.basicConfig(level=logging.INFO,
@@ -24,23 +33,8 @@ amount_disbursed_col = 'AMOUNT DISBURSED'
 transaction_narration_col = 'TRANSACTION NARRATION'
 effective_date_col = 'EFFECTIVE DATE'
 amount_col = 'Amount'
-
-def extract_r_number(text: str) -> str:
-    """Extracts an R-number from text."""
-    if isinstance(text, str):
-        match = re.search(r'(\d+R\d+)', text, re.IGNORECASE)
-        if match:
-            return match.group().upper()
-    return np.nan
-
-def create_unique_reference(row: pd.Series) -> str:
-    """Construct unique reference from R-number and amount."""
-    r_number = row.get(r_number_col)
-    amount = row.get(amount_col)
-    if pd.notna(r_number) and pd.notna(amount):
-        digits = r_number.upper().split('R')[-1]
-        return f"{digits}-{abs(amount):.2f}"
-    return np.nan
+stream_chunk_rows = 65536
+r_number_pattern = re.compile(r'(\d+R\d+)', re.IGNORECASE)
 
 def select_file(message: str) -> Path:
     """Prompt user for a file path."""
@@ -57,49 +51,291 @@ def select_file(message: str) -> Path:
         raise FileNotFoundError("No file selected")
     return Path(file_path)
 
+def stream_xlsx(path: Path, columns: list[str], skiprows: int = 0) -> pd.DataFrame:
+    """Read the given columns of the first sheet in row batches via openpyxl."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        for _ in islice(rows, skiprows):
+            pass
+        header = next(rows, ())
+        # Like pandas, a repeated header name selects its first column only.
+        first_position = {}
+        for i, name in enumerate(header):
+            if name in columns:
+                first_position.setdefault(name, i)
+        positions = list(first_position.values())
+        chunks = {name: [] for name in first_position}
+        while batch := list(islice(rows, stream_chunk_rows)):
+            # Read-only rows can be shorter than the header; pad them out.
+            cells = [tuple(row[i] if i < len(row) else None for i in positions)
+                     for row in batch]
+            cells = [row for row in cells if any(value is not None for value in row)]
+            for j, name in enumerate(chunks):
+                chunks[name].append(np.fromiter((row[j] for row in cells),
+                                                dtype=object, count=len(cells)))
+    finally:
+        workbook.close()
+    data = {name: np.concatenate(parts) if parts else np.empty(0, dtype=object)
+            for name, parts in chunks.items()}
+    return pd.DataFrame(data).infer_objects()
+
+def read_excel(path: Path, columns: list[str], skiprows: int = 0) -> pd.DataFrame:
+    """Read only the given columns of a workbook, preferring the calamine engine."""
+    kwargs = {'usecols': lambda name: name in columns, 'skiprows': skiprows}
+    try:
+        return pd.read_excel(path, engine='calamine', **kwargs)
+    except ImportError:
+        # python-calamine is optional; stream xlsx files through openpyxl's
+        # read-only mode and leave other formats to pandas.
+        if path.suffix.lower() in ('.xlsx', '.xlsm'):
+            return stream_xlsx(path, columns, skiprows=skiprows)
+        return pd.read_excel(path, **kwargs)
+
+def read_cached_excel(path: Path, columns: list[str], skiprows: int = 0) -> pd.DataFrame:
+    """Read a workbook via a Parquet sidecar keyed on the read options, mtime and size."""
+    stat = path.stat()
+    options = hashlib.sha1(repr((sorted(columns), skiprows)).encode()).hexdigest()[:8]
+    cache = path.with_name(
+        f"{path.name}.{options}.{stat.st_mtime_ns}-{stat.st_size}.parquet"
+    )
+    if cache.exists():
+        return pd.read_parquet(cache)
+    df = read_excel(path, columns, skiprows=skiprows)
+    tmp = cache.with_suffix('.tmp')
+    try:
+        df.to_parquet(tmp, compression='zstd', index=False)
+        # Sidecars for earlier versions of the workbook are now stale.
+        sidecar = re.compile(re.escape(path.name) + r'\.[0-9a-f]{8}\.\d+-\d+\.parquet')
+        for old in path.parent.glob(f'{glob.escape(path.name)}.*.parquet'):
+            if sidecar.fullmatch(old.name):
+                old.unlink(missing_ok=True)
+        tmp.replace(cache)
+    except Exception as exc:  # caching is best-effort
+        tmp.unlink(missing_ok=True)
+        logging.warning("Could not cache %s as Parquet: %s", path, exc)
+    return df
+
+def as_string_dtype(series: pd.Series) -> pd.Series:
+    """Convert text to the Arrow-backed string dtype, if pyarrow is available."""
+    try:
+        return series.astype('string[pyarrow]')
+    except ImportError:
+        return series.astype('string[python]')
+
 def process_disbursement_report(path: Path) -> pd.DataFrame:
     """Load and clean disbursement report."""
-    df = pd.read_excel(path, skiprows=6)
+    df = read_cached_excel(path, [transaction_narration_col, effective_date_col,
+                                  loan_number_col, amount_disbursed_col], skiprows=6)
     if transaction_narration_col not in df.columns:
         raise KeyError(f"Missing column {transaction_narration_col}")
-    df = df[~df[transaction_narration_col].str.contains('cash|nan', case=False, na=False)].copy()
-    df[effective_date_col] = pd.to_datetime(df[effective_date_col], errors='coerce')
-    df = df.dropna(subset=[loan_number_col, amount_disbursed_col])
-    df[unique_ref_col] = (
-        df[loan_number_col].astype(int).astype(str) + '-' +
-        df[amount_disbursed_col].apply(lambda x: f"{round(x, 2):.2f}")
+    df[transaction_narration_col] = as_string_dtype(df[transaction_narration_col])
+    narration = df[transaction_narration_col].str
+    excluded = (narration.contains('cash', case=False, na=False, regex=False) |
+                narration.contains('nan', case=False, na=False, regex=False))
+    df = df.loc[~excluded].dropna(subset=[loan_number_col, amount_disbursed_col])
+    loan_numbers = pd.to_numeric(
+        df[loan_number_col].to_numpy().astype(np.int64, copy=False), downcast='integer'
     )
-    return df
+    amounts = df[amount_disbursed_col].map('{:.2f}'.format).to_numpy(dtype=str)
+    return df.assign(**{
+        effective_date_col: pd.to_datetime(df[effective_date_col], errors='coerce'),
+        loan_number_col: loan_numbers,
+        unique_ref_col: np.char.add(np.char.add(np.char.mod('%d', loan_numbers), '-'), amounts),
+    })
 
 def process_bank_statement(path: Path) -> pd.DataFrame:
     """Load and clean bank statement."""
-    df = pd.read_excel(path)
+    df = read_cached_excel(path, [desc_col, date_col, amount_col])
     if desc_col not in df.columns:
         raise KeyError(f"Missing column {desc_col}")
-    df = df[~df[desc_col].str.contains('DEBIT TRANSFERST-', case=False, na=False)].copy()
-    df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-    df[r_number_col] = df[desc_col].apply(extract_r_number)
-    df[unique_ref_col] = df.apply(create_unique_reference, axis=1)
-    return df
+    df[desc_col] = as_string_dtype(df[desc_col])
+    df = df.loc[~df[desc_col].str.contains('DEBIT TRANSFERST-', case=False, na=False,
+                                           regex=False)]
+    r_numbers = df[desc_col].str.extract(r_number_pattern, expand=False).str.upper()
+    amounts = df[amount_col].abs().map('{:.2f}'.format, na_action='ignore')
+    return df.assign(**{
+        date_col: pd.to_datetime(df[date_col], errors='coerce'),
+        r_number_col: r_numbers,
+        unique_ref_col: r_numbers.str.split('R').str[-1].str.cat(amounts, sep='-'),
+    })
+
+def join_indices(left_codes: np.ndarray, right_codes: np.ndarray,
+                 width: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """Return the row positions of an inner join on factorized key codes.
+
+    With a width, each left code also matches right codes up to width away.
+    Pairs come out in left row order, then right code order within each left
+    row. Negative codes (missing keys) never match.
+    """
+    order = np.argsort(right_codes, kind='stable')
+    sorted_codes = right_codes[order]
+    starts = np.searchsorted(sorted_codes, np.maximum(left_codes - width, 0), side='left')
+    counts = np.searchsorted(sorted_codes, left_codes + width, side='right') - starts
+    counts[left_codes < 0] = 0
+    left_idx = np.repeat(np.arange(len(left_codes)), counts)
+    # Offset of each pair within its key's run of right rows.
+    run_offsets = np.arange(len(left_idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+    right_idx = order[np.repeat(starts, counts) + run_offsets]
+    return left_idx, right_idx
+
+def select_pairs(bank_idx: np.ndarray, disb_idx: np.ndarray, gaps: np.ndarray) -> np.ndarray:
+    """Mask a one-to-one subset of candidate pairs, closest dates first.
+
+    Candidates are visited once in (gap, bank row, disbursement row) order and
+    kept unless either row is already used, so ties go to the earlier bank row.
+    """
+    order = np.lexsort((disb_idx, bank_idx, gaps))
+    bank_used, disb_used = set(), set()
+    chosen = []
+    for pos, bank_row, disb_row in zip(order.tolist(), bank_idx[order].tolist(),
+                                       disb_idx[order].tolist()):
+        if bank_row not in bank_used and disb_row not in disb_used:
+            bank_used.add(bank_row)
+            disb_used.add(disb_row)
+            chosen.append(pos)
+    keep = np.zeros(len(order), dtype=bool)
+    keep[chosen] = True
+    return keep
+
+def day_gaps(bank_days: np.ndarray, disb_days: np.ndarray) -> np.ndarray:
+    """Return absolute gaps between two int64 day-number arrays."""
+    return np.abs(bank_days - disb_days)
+
+def candidate_pairs(bank_keys: np.ndarray, bank_dates: np.ndarray, disb_keys: np.ndarray,
+                    disb_dates: np.ndarray, max_days: int = 7):
+    """Return bank rows, disbursement rows and day gaps of same-key pairs in the window.
+
+    Rows missing a key or a date never pair up.
+    """
+    codes, _ = pd.factorize(np.concatenate([np.asarray(bank_keys, dtype=object),
+                                            np.asarray(disb_keys, dtype=object)]))
+    dates = np.concatenate([np.asarray(bank_dates, dtype='datetime64[D]'),
+                            np.asarray(disb_dates, dtype='datetime64[D]')])
+    days = dates.view(np.int64)
+    valid = (codes >= 0) & ~np.isnat(dates)
+    # One sortable int per row: the key code, then the day within the span of
+    # dates padded by the window, so a band join on it never crosses keys and
+    # only produces pairs inside the window.
+    first, last = (days[valid].min(), days[valid].max()) if valid.any() else (0, 0)
+    span = last - first + 2 * max_days + 1
+    band = np.where(valid, codes * span + (days - first + max_days), -1)
+    bank_idx, disb_idx = join_indices(band[:len(bank_keys)], band[len(bank_keys):], max_days)
+    gaps = day_gaps(days[bank_idx], days[len(bank_keys):][disb_idx])
+    return bank_idx, disb_idx, gaps
 
 def merge_frames(bank_df: pd.DataFrame, disb_df: pd.DataFrame):
     """Merge and split matched/unmatched records."""
-    merged = pd.merge(bank_df, disb_df, on=unique_ref_col, how='outer',
-                      suffixes=('_bank', '_disb'))
-    merged[date_col] = pd.to_datetime(merged[date_col], errors='coerce')
-    merged[effective_date_col] = pd.to_datetime(merged[effective_date_col], errors='coerce')
-    merged['date_diff'] = (merged[date_col] - merged[effective_date_col]).abs().dt.days
-    matched = merged.dropna(subset=[date_col, effective_date_col])
-    matched = matched[matched['date_diff'] <= 7]
-    unmatched_bank = merged[merged[effective_date_col].isna()]
-    unmatched_disb = merged[merged[date_col].isna()]
+    # Only same-reference pairs inside the seven-day window are generated, and
+    # each row is matched at most once, closest dates first. Rows left over
+    # (including those missing a key or a date) go to the unmatched reports.
+    bank_idx, disb_idx, gaps = candidate_pairs(
+        bank_df[unique_ref_col].to_numpy(dtype=object, na_value=None),
+        bank_df[date_col].to_numpy('datetime64[D]'),
+        disb_df[unique_ref_col].to_numpy(dtype=object, na_value=None),
+        disb_df[effective_date_col].to_numpy('datetime64[D]'),
+    )
+    keep = select_pairs(bank_idx, disb_idx, gaps)
+    order = np.lexsort((disb_idx[keep], bank_idx[keep]))
+    bank_idx, disb_idx, gaps = bank_idx[keep][order], disb_idx[keep][order], gaps[keep][order]
+    disb_payload = disb_df.drop(columns=unique_ref_col)
+    overlap = bank_df.columns.intersection(disb_payload.columns)
+    matched = pd.concat([
+        bank_df.take(bank_idx).rename(columns={c: f'{c}_bank' for c in overlap})
+        .reset_index(drop=True),
+        disb_payload.take(disb_idx).rename(columns={c: f'{c}_disb' for c in overlap})
+        .reset_index(drop=True),
+    ], axis=1).assign(date_diff=gaps)
+    bank_hit = np.zeros(len(bank_df), dtype=bool)
+    bank_hit[bank_idx] = True
+    disb_hit = np.zeros(len(disb_df), dtype=bool)
+    disb_hit[disb_idx] = True
+    unmatched_bank = bank_df[~bank_hit]
+    unmatched_disb = disb_df[~disb_hit]
     return matched, unmatched_bank, unmatched_disb
 
+def polars_pipeline(bank_path: Path, disb_path: Path):
+    """Run the whole reconciliation on Polars lazy frames.
+
+    Mirrors process_bank_statement, process_disbursement_report and
+    merge_frames, returning the same three frames as pandas DataFrames.
+    """
+    import polars as pl
+
+    def to_datetime(frame: pl.LazyFrame, name: str) -> pl.Expr:
+        if frame.collect_schema()[name] == pl.String:
+            return pl.col(name).str.to_datetime(strict=False)
+        return pl.col(name).cast(pl.Datetime)
+
+    def format_amount(amount: pl.Expr) -> pl.Expr:
+        # Same formatter as the pandas path: Polars' own rounding works on the
+        # scaled float and turns e.g. 2.675 into 2.68 where '{:.2f}' gives 2.67.
+        return amount.map_elements('{:.2f}'.format, return_dtype=pl.String)
+
+    bank = pl.read_excel(bank_path, columns=[desc_col, date_col, amount_col]).lazy()
+    debit_transfer = (pl.col(desc_col).str.to_uppercase()
+                      .str.contains('DEBIT TRANSFERST-', literal=True).fill_null(False))
+    bank = (
+        bank.filter(~debit_transfer)
+        .with_columns(
+            to_datetime(bank, date_col),
+            pl.col(desc_col).str.extract(f'(?i){r_number_pattern.pattern}', 1)
+            .str.to_uppercase().alias(r_number_col),
+        )
+        .with_columns(
+            (pl.col(r_number_col).str.split('R').list.last() + '-' +
+             format_amount(pl.col(amount_col).abs())).alias(unique_ref_col)
+        )
+    )
+
+    disb = pl.read_excel(disb_path,
+                         columns=[transaction_narration_col, effective_date_col,
+                                  loan_number_col, amount_disbursed_col],
+                         read_options={'header_row': 6}).lazy()
+    narration = pl.col(transaction_narration_col).str.to_lowercase()
+    excluded = (narration.str.contains('cash', literal=True) |
+                narration.str.contains('nan', literal=True)).fill_null(False)
+    disb = (
+        disb.filter(~excluded)
+        .with_columns(to_datetime(disb, effective_date_col))
+        .drop_nulls([loan_number_col, amount_disbursed_col])
+        .with_columns(
+            (pl.col(loan_number_col).cast(pl.Int64).cast(pl.String) + '-' +
+             format_amount(pl.col(amount_disbursed_col))).alias(unique_ref_col)
+        )
+    )
+
+    # collect_all runs both plans together; the pairing then reuses the
+    # windowed candidates and select_pairs, so both engines pick the same rows.
+    bank, disb = pl.collect_all([bank, disb])
+    bank_rows, disb_rows, gaps = candidate_pairs(
+        bank[unique_ref_col].to_numpy(), bank[date_col].to_numpy(),
+        disb[unique_ref_col].to_numpy(), disb[effective_date_col].to_numpy(),
+    )
+    keep = select_pairs(bank_rows, disb_rows, gaps)
+    order = np.lexsort((disb_rows[keep], bank_rows[keep]))
+    bank_rows, disb_rows, gaps = bank_rows[keep][order], disb_rows[keep][order], gaps[keep][order]
+    matched = pl.concat([
+        bank.select(pl.all().gather(bank_rows)),
+        disb.drop(unique_ref_col).select(pl.all().gather(disb_rows)),
+        pl.DataFrame({'date_diff': gaps}),
+    ], how='horizontal')
+    bank_hit = np.zeros(bank.height, dtype=bool)
+    bank_hit[bank_rows] = True
+    disb_hit = np.zeros(disb.height, dtype=bool)
+    disb_hit[disb_rows] = True
+    frames = (matched, bank.filter(pl.Series(~bank_hit)), disb.filter(pl.Series(~disb_hit)))
+    return tuple(frame.to_pandas() for frame in frames)
+
 
 class ReconciliationApp:
     """Tkinter-based interface for running the reconciliation."""
 
-    def __init__(self, root: tk.Tk):
+    def __init__(self, root: 'tk.Tk'):
+        import tkinter as tk
+
         self.root = root
         self.root.title("Bank vs Disbursement Reconciliation Tool")
         self.root.geometry("700x400")
@@ -123,6 +359,9 @@ class ReconciliationApp:
         self.create_widgets()
 
     def create_widgets(self) -> None:
+        import tkinter as tk
+        from tkinter import ttk
+
         opts = {'padx': 10, 'pady': 10}
 
         instructions = (
@@ -178,6 +417,8 @@ class ReconciliationApp:
         self.disb_path.trace_add('write', self.check_ready)
 
     def browse_bank(self) -> None:
+        from tkinter import filedialog
+
         path = filedialog.askopenfilename(
             title="Select Bank Statement",
             filetypes=[("Excel files", "*.xlsx *.xls"), ("All files", "*.*")],
@@ -186,6 +427,8 @@ class ReconciliationApp:
             self.bank_path.set(path)
 
     def browse_disb(self) -> None:
+        from tkinter import filedialog
+
         path = filedialog.askopenfilename(
             title="Select Disbursement Report",
             filetypes=[("Excel files", "*.xlsx *.xls"), ("All files", "*.*")],
@@ -200,11 +443,14 @@ class ReconciliationApp:
             self.reconcile_button.config(state='disabled')
 
     def run_reconciliation(self) -> None:
+        from tkinter import messagebox
+
         try:
             out_bank, out_disb = reconcile(
                 Path(self.bank_path.get()),
                 Path(self.disb_path.get()),
                 Path.cwd(),
+                excel_output=True,
             )
             self.status_var.set("Reconciliation complete. Output saved.")
             messagebox.showinfo(
@@ -220,16 +466,39 @@ class ReconciliationApp:
             self.status_var.set(f"Error: {exc}")
             messagebox.showerror("Error", str(exc))
 
-def reconcile(bank_path: Path, disb_path: Path, output_dir: Path) -> tuple[Path, Path]:
+def write_frame(df: pd.DataFrame, path: Path) -> None:
+    """Write a frame as Parquet, or as a streamed workbook for .xlsx paths."""
+    if path.suffix != '.xlsx':
+        df.to_parquet(path, compression='zstd', index=False)
+        return
+    import xlsxwriter
+
+    # constant_memory flushes each row once the next one starts, so rows must
+    # be written in order; pandas' to_excel writes column by column instead.
+    workbook = xlsxwriter.Workbook(str(path), {'constant_memory': True,
+                                               'default_date_format': 'yyyy-mm-dd hh:mm:ss'})
+    worksheet = workbook.add_worksheet()
+    worksheet.write_row(0, 0, df.columns)
+    values = df.astype(object).where(df.notna(), None)
+    for row_num, row in enumerate(values.itertuples(index=False), start=1):
+        worksheet.write_row(row_num, 0, row)
+    workbook.close()
+
+def reconcile(bank_path: Path, disb_path: Path, output_dir: Path,
+              excel_output: bool = False, engine: str = 'pandas') -> tuple[Path, Path]:
     """Process Excel files and write unmatched entries to disk."""
-    bank_df = process_bank_statement(bank_path)
-    disb_df = process_disbursement_report(disb_path)
-    matched, unmatched_bank, unmatched_disb = merge_frames(bank_df, disb_df)
+    if engine == 'polars':
+        matched, unmatched_bank, unmatched_disb = polars_pipeline(bank_path, disb_path)
+    else:
+        bank_df = process_bank_statement(bank_path)
+        disb_df = process_disbursement_report(disb_path)
+        matched, unmatched_bank, unmatched_disb = merge_frames(bank_df, disb_df)
     timestamp = datetime.now().strftime('%Y%m%d%H%M')
-    bank_out = output_dir / f"Unmatched_Bank_{timestamp}.xlsx"
-    disb_out = output_dir / f"Unmatched_Disbursement_{timestamp}.xlsx"
-    unmatched_bank.to_excel(bank_out, index=False)
-    unmatched_disb.to_excel(disb_out, index=False)
+    suffix = '.xlsx' if excel_output else '.parquet'
+    bank_out = output_dir / f"Unmatched_Bank_{timestamp}{suffix}"
+    disb_out = output_dir / f"Unmatched_Disbursement_{timestamp}{suffix}"
+    write_frame(unmatched_bank, bank_out)
+    write_frame(unmatched_disb, disb_out)
     logging.info("Reconciliation complete")
     logging.info("Matched sample:\n%s", matched.head())
     return bank_out, disb_out
@@ -241,23 +510,29 @@ def main():
     parser.add_argument('--disbursement', type=Path, help='Path to disbursement report Excel')
     parser.add_argument('--output', type=Path, help='Directory for output files', default=Path.cwd())
     parser.add_argument('--gui', action='store_true', help='Launch graphical interface')
+    parser.add_argument('--excel-output', action='store_true',
+                        help='Write unmatched entries as Excel instead of Parquet')
+    parser.add_argument('--engine', choices=('pandas', 'polars'), default='pandas',
+                        help='Dataframe library used to run the reconciliation')
     args = parser.parse_args()
 
     launch_gui = args.gui or not (args.bank and args.disbursement)
     if launch_gui:
+        import tkinter as tk
+
         root = tk.Tk()
         app = ReconciliationApp(root)
         root.mainloop()
     else:
         bank = args.bank or select_file("Select the bank statement")
         disb = args.disbursement or select_file("Select the disbursement report")
-        out_bank, out_disb = reconcile(bank, disb, args.output)
+        out_bank, out_disb = reconcile(bank, disb, args.output,
+                                       excel_output=args.excel_output,
+                                       engine=args.engine)
         print(
             f"Reconciliation complete. Files saved to:\n{out_bank}\n{out_disb}"
         )
 
 
 if __name__ == '__main__':
-    root = tk.Tk()
-    app = ReconciliationApp(root)
-    root.mainloop()
+    main()
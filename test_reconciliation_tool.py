@@ -0,0 +1,309 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook, load_workbook
+
+import reconciliation_tool as rt
+
+
+def write_bank_statement(path):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Date', 'Description', 'Amount', 'Balance'])
+    rows = [
+        ('PAY 12R345 X', -100.5),
+        ('ref 7r88 ok', 300.126),
+        (None, 50),
+        ('AA 5R10', None),
+        ('debit transferst-9 1R2', 20),
+        ('X 3R4 and 9R8', 2.675),
+        ('no ref', 5),
+    ]
+    for day, (description, amount) in enumerate(rows, start=2):
+        sheet.append([datetime(2024, 1, day), description, amount, 0])
+    workbook.save(path)
+    return path
+
+
+def write_disbursement_report(path):
+    workbook = Workbook()
+    sheet = workbook.active
+    for _ in range(6):
+        sheet.append(['report header'])
+    sheet.append(['LOAN NUMBER', 'AMOUNT DISBURSED', 'TRANSACTION NARRATION', 'EFFECTIVE DATE'])
+    rows = [
+        (345, 100.5, 'EFT'),
+        (88, 300.13, 'Cash out'),
+        (999, 1, 'Financial services'),
+        (12, -5, None),
+        (None, 5, 'EFT'),
+        (8, 2.675, 'EFT'),
+        (70000, 1, 'EFT'),
+    ]
+    for day, row in enumerate(rows, start=3):
+        sheet.append([*row, datetime(2024, 1, day)])
+    workbook.save(path)
+    return path
+
+
+def test_process_bank_statement_builds_baseline_references(tmp_path):
+    df = rt.process_bank_statement(write_bank_statement(tmp_path / 'bank.xlsx'))
+
+    # Values produced by the original row-wise implementation.
+    assert df[rt.desc_col].tolist()[:2] == ['PAY 12R345 X', 'ref 7r88 ok']
+    assert pd.isna(df[rt.desc_col].iloc[2])
+    assert df[rt.r_number_col].fillna('').tolist() == ['12R345', '7R88', '', '5R10', '3R4', '']
+    assert df[rt.unique_ref_col].fillna('').tolist() == [
+        '345-100.50', '88-300.13', '', '', '4-2.67', '',
+    ]
+
+
+def test_process_disbursement_report_builds_baseline_references(tmp_path):
+    df = rt.process_disbursement_report(write_disbursement_report(tmp_path / 'disb.xlsx'))
+
+    # 'Financial' contains 'nan' and is excluded along with the cash row,
+    # exactly as the original filter did; the missing loan number is dropped.
+    assert df[rt.loan_number_col].tolist() == [345, 12, 8, 70000]
+    assert df[rt.unique_ref_col].tolist() == ['345-100.50', '12--5.00', '8-2.67', '70000-1.00']
+
+
+def frames(bank_refs, bank_dates, disb_refs, disb_dates):
+    bank = pd.DataFrame({rt.unique_ref_col: bank_refs,
+                         rt.date_col: pd.to_datetime(bank_dates)})
+    disb = pd.DataFrame({rt.unique_ref_col: disb_refs,
+                         rt.effective_date_col: pd.to_datetime(disb_dates)})
+    return bank, disb
+
+
+def test_merge_frames_reports_pairs_outside_the_window_as_unmatched():
+    bank, disb = frames(['5-1.00'], ['2024-01-01'], ['5-1.00'], ['2024-01-15'])
+    matched, unmatched_bank, unmatched_disb = rt.merge_frames(bank, disb)
+    assert matched.empty
+    assert len(unmatched_bank) == 1
+    assert len(unmatched_disb) == 1
+
+
+def test_merge_frames_reports_pairs_with_missing_dates_as_unmatched():
+    bank, disb = frames(['6-2.00'], [None], ['6-2.00'], ['2024-01-01'])
+    matched, unmatched_bank, unmatched_disb = rt.merge_frames(bank, disb)
+    assert matched.empty
+    assert len(unmatched_bank) == 1
+    assert len(unmatched_disb) == 1
+
+
+def test_merge_frames_keeps_missing_keys_unmatched():
+    bank, disb = frames([None, '1-1.00'], ['2024-01-01'] * 2, ['1-1.00'], ['2024-01-02'])
+    matched, unmatched_bank, unmatched_disb = rt.merge_frames(bank, disb)
+    assert matched['date_diff'].tolist() == [1]
+    assert unmatched_bank[rt.unique_ref_col].isna().all()
+    assert unmatched_disb.empty
+
+
+def test_read_cached_excel_keys_sidecars_on_file_name_and_options(tmp_path):
+    path = write_bank_statement(tmp_path / 'bank.xlsx')
+    sibling = tmp_path / 'bank.xlsm'
+    sibling.write_bytes(path.read_bytes())
+    columns = [rt.date_col, rt.desc_col, rt.amount_col]
+
+    rt.read_cached_excel(sibling, columns)
+    first = rt.read_cached_excel(path, columns)
+    caches = sorted(p.name for p in tmp_path.glob('*.parquet'))
+    assert len(caches) == 2
+    assert caches[0].startswith('bank.xlsm.') and caches[1].startswith('bank.xlsx.')
+
+    # A cache hit reads the sidecar, not the workbook.
+    pd.DataFrame({'cached': [1]}).to_parquet(tmp_path / caches[1])
+    assert rt.read_cached_excel(path, columns).columns.tolist() == ['cached']
+
+    # A different column list misses and replaces the stale sidecar, leaving
+    # the .xlsm cache alone.
+    second = rt.read_cached_excel(path, columns[:2])
+    assert second.columns.tolist() == columns[:2]
+    assert second.equals(first[columns[:2]])
+    remaining = sorted(p.name for p in tmp_path.glob('*.parquet'))
+    assert len(remaining) == 2
+    assert remaining[0] == caches[0]
+    assert remaining[1] != caches[1] and remaining[1].startswith('bank.xlsx.')
+
+
+def test_stream_xlsx_reads_requested_columns(tmp_path):
+    path = tmp_path / 'report.xlsx'
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['title'])
+    sheet.append(['Description', 'Description', 'Other', 'Date', 'Amount'])
+    sheet.append(['first', 'second', 'x', datetime(2024, 1, 2), 1.5])
+    sheet.append([None, None, None, None, None])
+    sheet.append(['third', None, None, None, 2])
+    workbook.save(path)
+
+    df = rt.stream_xlsx(path, ['Description', 'Date', 'Amount'], skiprows=1)
+
+    assert df.columns.tolist() == ['Description', 'Date', 'Amount']
+    assert df['Description'].tolist() == ['first', 'third']
+    assert df['Date'].iloc[0] == pd.Timestamp('2024-01-02')
+    assert pd.isna(df['Date'].iloc[1])
+    assert df['Amount'].tolist() == [1.5, 2.0]
+
+
+@pytest.mark.parametrize('suffix', ['.parquet', '.xlsx'])
+def test_write_frame_round_trips(tmp_path, suffix):
+    df = pd.DataFrame({
+        'Date': pd.to_datetime(['2024-01-02 13:45:10', None, '2024-01-04 00:00:00']),
+        'Description': pd.array(['a', None, 'c'], dtype='string'),
+        'Amount': [1.5, np.nan, -3.0],
+    })
+    path = tmp_path / f'out{suffix}'
+    rt.write_frame(df, path)
+    read = pd.read_parquet(path) if suffix == '.parquet' else pd.read_excel(path)
+    assert read.columns.tolist() == df.columns.tolist()
+    assert read['Date'].tolist()[::2] == df['Date'].tolist()[::2]
+    assert pd.isna(read['Date'].iloc[1])
+    assert read['Description'].tolist()[::2] == ['a', 'c']
+    assert pd.isna(read['Description'].iloc[1])
+    assert read['Amount'].tolist()[::2] == [1.5, -3.0]
+
+
+def test_write_frame_shows_the_time_of_day_in_excel(tmp_path):
+    path = tmp_path / 'out.xlsx'
+    rt.write_frame(pd.DataFrame({'Date': pd.to_datetime(['2024-01-02 13:45:10'])}), path)
+    cell = load_workbook(path)['Sheet1']['A2']
+    assert cell.number_format == 'yyyy-mm-dd hh:mm:ss'
+
+
+def pairs(left_idx, right_idx):
+    return sorted(zip(left_idx.tolist(), right_idx.tolist()))
+
+
+def test_join_indices_matches_pd_merge():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        left = rng.integers(-1, 5, rng.integers(0, 20))
+        right = rng.integers(-1, 5, rng.integers(0, 20))
+        expected = pd.merge(
+            pd.DataFrame({'key': left, 'l': range(len(left))}).query('key >= 0'),
+            pd.DataFrame({'key': right, 'r': range(len(right))}).query('key >= 0'),
+            on='key',
+        )
+        left_idx, right_idx = rt.join_indices(left, right)
+        assert pairs(left_idx, right_idx) == sorted(zip(expected['l'], expected['r']))
+        assert list(left_idx) == sorted(left_idx)
+
+
+def test_join_indices_never_matches_missing_keys():
+    left_idx, right_idx = rt.join_indices(np.array([-1, 0]), np.array([-1, -1, 0]))
+    assert pairs(left_idx, right_idx) == [(1, 2)]
+
+
+def records(frame):
+    frame = frame.reset_index(drop=True)
+    frame = frame[sorted(frame.columns)].astype(object)
+    return frame.where(frame.notna(), None).to_dict('records')
+
+
+def test_polars_engine_matches_pandas(tmp_path):
+    pytest.importorskip('polars')
+    pytest.importorskip('fastexcel')
+    bank_path = write_bank_statement(tmp_path / 'bank.xlsx')
+    disb_path = write_disbursement_report(tmp_path / 'disb.xlsx')
+
+    expected = rt.merge_frames(rt.process_bank_statement(bank_path),
+                               rt.process_disbursement_report(disb_path))
+    actual = rt.polars_pipeline(bank_path, disb_path)
+
+    assert actual[1][rt.unique_ref_col].fillna('').tolist() == \
+        expected[1][rt.unique_ref_col].fillna('').tolist()
+    assert actual[2][rt.unique_ref_col].tolist() == expected[2][rt.unique_ref_col].tolist()
+    for polars_frame, pandas_frame in zip(actual, expected):
+        assert records(polars_frame) == records(pandas_frame)
+
+
+def test_join_indices_with_width_matches_nearby_codes():
+    left_idx, right_idx = rt.join_indices(np.array([5, -1, 0]), np.array([-1, 3, 7, 8, 1]), 2)
+    assert pairs(left_idx, right_idx) == [(0, 1), (0, 2), (2, 4)]
+
+
+def test_select_pairs_is_one_to_one_and_closest_first():
+    # Bank rows 0 and 1 both want disbursement 0; row 1 is closer.
+    bank_idx = np.array([0, 1, 1])
+    disb_idx = np.array([0, 0, 1])
+    gaps = np.array([5, 0, 3])
+    keep = rt.select_pairs(bank_idx, disb_idx, gaps)
+    assert pairs(bank_idx[keep], disb_idx[keep]) == [(1, 0)]
+
+
+def test_select_pairs_ties_go_to_earlier_bank_row():
+    keep = rt.select_pairs(np.array([1, 0]), np.array([0, 0]), np.array([2, 2]))
+    assert keep.tolist() == [False, True]
+
+
+def test_candidate_pairs_only_generates_pairs_inside_the_window():
+    rng = np.random.default_rng(2)
+    for _ in range(50):
+        nb, nd = rng.integers(0, 30, 2)
+        bank_keys = rng.choice(['a', 'b', None], nb)
+        disb_keys = rng.choice(['a', 'b', 'c'], nd)
+        bank_dates = np.datetime64('2024-01-01') + rng.integers(0, 40, nb)
+        disb_dates = np.datetime64('2024-01-01') + rng.integers(0, 40, nd)
+        bank_dates[rng.random(nb) < 0.2] = np.datetime64('NaT')
+
+        bank_idx, disb_idx, gaps = rt.candidate_pairs(bank_keys, bank_dates, disb_keys, disb_dates)
+
+        expected = [
+            (b, d) for b in range(nb) for d in range(nd)
+            if bank_keys[b] is not None and bank_keys[b] == disb_keys[d]
+            and not np.isnat(bank_dates[b])
+            and abs((bank_dates[b] - disb_dates[d]).astype(int)) <= 7
+        ]
+        assert pairs(bank_idx, disb_idx) == expected
+        assert (gaps == np.abs((bank_dates[bank_idx] - disb_dates[disb_idx]).astype(int))).all()
+
+
+def test_merge_frames_pairs_repeated_references_within_window():
+    bank, disb = frames(['5-1.00', '5-1.00'], ['2024-01-01', '2024-01-15'],
+                        ['5-1.00'], ['2024-01-15'])
+    matched, unmatched_bank, unmatched_disb = rt.merge_frames(bank, disb)
+    assert matched[rt.date_col].tolist() == [pd.Timestamp('2024-01-15')]
+    assert matched['date_diff'].tolist() == [0]
+    assert unmatched_bank[rt.date_col].tolist() == [pd.Timestamp('2024-01-01')]
+    assert unmatched_disb.empty
+
+
+def test_merge_frames_pairs_hundreds_of_repeats_of_one_reference():
+    # Every row shares one reference; only pairs inside the window are
+    # generated, and the greedy pass matches each row at most once.
+    n = 3000
+    days = pd.Timestamp('2024-01-01') + pd.to_timedelta(2 * np.arange(n), 'D')
+    bank, disb = frames(['1-1.00'] * n, days, ['1-1.00'] * n, days + pd.Timedelta(days=1))
+    matched, unmatched_bank, unmatched_disb = rt.merge_frames(bank, disb)
+    assert len(matched) == n
+    assert (matched['date_diff'] == 1).all()
+    assert unmatched_bank.empty and unmatched_disb.empty
+
+
+def test_merge_frames_accounts_for_every_row_once():
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        nb, nd = rng.integers(0, 15, 2)
+        bank_dates = (pd.Timestamp('2024-01-01')
+                      + pd.to_timedelta(rng.integers(0, 20, nb), 'D')).to_series()
+        bank_dates[rng.random(nb) < 0.2] = pd.NaT
+        bank, disb = frames(
+            pd.Series(rng.choice(['a', 'b', 'c', None], nb), dtype=object),
+            bank_dates.to_numpy(),
+            rng.choice(['a', 'b', 'd'], nd),
+            pd.Timestamp('2024-01-08') + pd.to_timedelta(rng.integers(0, 5, nd), 'D'),
+        )
+        bank['row'] = range(nb)
+        disb['row'] = range(nd)
+        matched, unmatched_bank, unmatched_disb = rt.merge_frames(bank, disb)
+
+        assert (matched['date_diff'] <= 7).all()
+        assert matched['row_bank'].is_unique and matched['row_disb'].is_unique
+        assert sorted([*matched['row_bank'], *unmatched_bank['row']]) == list(range(nb))
+        assert sorted([*matched['row_disb'], *unmatched_disb['row']]) == list(range(nd))
+        for _, pair in matched.iterrows():
+            assert bank.loc[pair['row_bank'], rt.unique_ref_col] == \
+                disb.loc[pair['row_disb'], rt.unique_ref_col]